@@ -0,0 +1,40 @@
+import pandas as pd
+
+# Dataset files - the app only loads the Parquet file built from the workbook
+DATASET_XLSX = "AyurGenixAI_Dataset (1).xlsx"
+DATASET_PARQUET = "AyurGenixAI_Dataset.parquet"
+
+# Columns the app reads from the dataset
+DATASET_COLUMNS = [
+    "Disease", "Symptoms", "Ayurvedic Herbs", "Formulation", "Doshas",
+    "Diet and Lifestyle Recommendations", "Yoga & Physical Therapy", "Prevention",
+]
+
+# Convert the workbook to Parquet - run again whenever the workbook changes
+def convert_dataset():
+    # calamine parses the workbook in native code; only the columns the
+    # app reads are kept, as plain strings without type inference
+    df = pd.read_excel(
+        DATASET_XLSX,
+        engine="calamine",
+        dtype=str,
+        usecols=lambda column: column in DATASET_COLUMNS,
+    )
+    # Check the columns the app reads once here, so lookups can index directly
+    missing = [column for column in DATASET_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"missing columns {', '.join(missing)}")
+    # The sheet starts with a blank row; drop rows without a disease and
+    # renumber so the index stays the row's position
+    df = df.dropna(subset=["Disease"]).reset_index(drop=True)
+    # Lowercase the searchable text once here instead of on every query, and
+    # store it as categorical so repeated rows are only scanned once
+    df["_search_blob"] = (
+        df["Disease"].fillna("").astype(str) + " ¶ " + df["Symptoms"].fillna("").astype(str)
+    ).str.lower().astype("category")
+    df.to_parquet(DATASET_PARQUET, engine="pyarrow", compression="zstd")
+    return df
+
+if __name__ == "__main__":
+    df = convert_dataset()
+    print(f"Wrote {len(df)} rows to {DATASET_PARQUET}")
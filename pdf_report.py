@@ -0,0 +1,101 @@
+import io
+import re
+from xml.sax.saxutils import escape
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph
+
+# PDF consultation report - kept out of streamlit_app.py, which Streamlit
+# re-executes on every rerun, so the styles and pattern below are built
+# once per process
+
+# Characters the PDF report drops: markdown markers and anything non-ASCII
+PDF_UNSAFE_CHARS = re.compile(r"[*#\x80-\U0010ffff]+")
+
+# Paragraph styles for the PDF report
+PDF_STYLES = {
+    "ReportTitle": ParagraphStyle(
+        "ReportTitle", fontName="Helvetica-Bold", fontSize=20, leading=28, alignment=TA_CENTER
+    ),
+    "Generated": ParagraphStyle(
+        "Generated", fontName="Helvetica", fontSize=10, leading=22, alignment=TA_CENTER, spaceAfter=28
+    ),
+    "Section": ParagraphStyle("Section", fontName="Helvetica-Bold", fontSize=14, leading=28, spaceBefore=14),
+    "Label": ParagraphStyle("Label", fontName="Helvetica-Bold", fontSize=11, leading=20),
+    "Value": ParagraphStyle("Value", fontName="Helvetica", fontSize=11, leading=17, spaceAfter=6),
+    "UserLabel": ParagraphStyle(
+        "UserLabel", fontName="Helvetica-Bold", fontSize=11, leading=22, textColor=colors.HexColor("#000080")
+    ),  # Blue for user
+    "ModelLabel": ParagraphStyle(
+        "ModelLabel", fontName="Helvetica-Bold", fontSize=11, leading=22, textColor=colors.HexColor("#006400")
+    ),  # Green for AI
+    "Message": ParagraphStyle("Message", fontName="Helvetica", fontSize=10, leading=17, spaceAfter=14),
+    "Disclaimer": ParagraphStyle(
+        "Disclaimer", fontName="Helvetica-Oblique", fontSize=9, leading=17, spaceBefore=28,
+        textColor=colors.HexColor("#646464"),
+    ),
+}
+
+# Helper function to sanitize text for PDF (ASCII-safe)
+def sanitize_for_pdf(text):
+    """Remove non-ASCII characters and clean text for PDF generation."""
+    if not text:
+        return ""
+    # Remove markdown formatting and non-ASCII characters in a single pass
+    text = PDF_UNSAFE_CHARS.sub('', str(text))
+    # Clean up any extra whitespace
+    text = ' '.join(text.split())
+    # Paragraph text is markup, so keep <, > and & literal
+    return escape(text)
+
+# Lay out the consultation report in a single reportlab build pass;
+# generated_at is the timestamp printed under the title
+def build_pdf_report(user_info, conversation, generated_at):
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=28, rightMargin=28, topMargin=28, bottomMargin=42)
+    
+    # Title
+    story = [
+        Paragraph("AyurGenix AI - Consultation Report", PDF_STYLES["ReportTitle"]),
+        Paragraph(f"Generated: {generated_at}", PDF_STYLES["Generated"]),
+    ]
+    
+    # User Profile Section
+    story.append(Paragraph("User Profile", PDF_STYLES["Section"]))
+    
+    profile_items = [
+        ("Name", user_info.get('name', 'Not provided')),
+        ("Age", str(user_info.get('age', 'Not provided'))),
+        ("Gender", user_info.get('gender', 'Not provided')),
+        ("Dosha Type", user_info.get('dosha', 'Unknown')),
+        ("Stress Level", user_info.get('stress', 'Not provided')),
+        ("Existing Conditions", user_info.get('conditions', 'None mentioned')),
+        ("Current Medications", user_info.get('medications', 'None mentioned')),
+    ]
+    
+    for label, value in profile_items:
+        story.append(Paragraph(f"{label}:", PDF_STYLES["Label"]))
+        story.append(Paragraph(sanitize_for_pdf(value), PDF_STYLES["Value"]))
+    
+    # Consultation Summary Section
+    story.append(Paragraph("Consultation Summary", PDF_STYLES["Section"]))
+    
+    for msg in conversation:
+        if msg["role"] == "user":
+            story.append(Paragraph("You:", PDF_STYLES["UserLabel"]))
+        else:
+            story.append(Paragraph("AyurGenix AI:", PDF_STYLES["ModelLabel"]))
+        # Sanitize content for PDF
+        story.append(Paragraph(sanitize_for_pdf(msg['content']), PDF_STYLES["Message"]))
+        
+    # Disclaimer
+    story.append(Paragraph(
+        "Disclaimer: This report is for informational purposes only. Please consult a qualified healthcare provider for medical concerns.",
+        PDF_STYLES["Disclaimer"],
+    ))
+    
+    # Return PDF as bytes
+    doc.build(story)
+    return buffer.getvalue()
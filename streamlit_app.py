@@ -1,18 +1,87 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from google import genai
-from google.genai import types
+from google.genai import types, errors
 from dotenv import load_dotenv
 import os
+import time
+import threading
 from datetime import datetime
-from fpdf import FPDF
-import io
+import re
+import sqlite3
+import ahocorasick
+import hashlib
+import json
+import uuid
+from functools import partial
+from rapidfuzz import process, fuzz
+from diskcache import Cache
+from convert_dataset import DATASET_PARQUET, DATASET_COLUMNS
+from pdf_report import build_pdf_report
 
 # Load environment variables
 load_dotenv()
 
 # Model configuration
 MODEL = "gemini-2.0-flash"
+MODEL_FAST = "gemini-2.0-flash-lite"  # profile greeting only
+MAX_OUTPUT_TOKENS = 1024
+
+SYSTEM_INSTRUCTION = """You are AyurGenix AI, a compassionate Ayurvedic medicine assistant.
+- The database data in each prompt is verified; it is your PRIMARY source.
+- First, a "### 🔍 Possible Ayurvedic Conditions" section matching the user's symptoms to database diseases (or likely Vata/Pitta/Kapha imbalances if vague).
+- Then a treatment plan quoting the database's herbs, formulations, diet and yoga, starting "Based on our verified Ayurvedic database...".
+- Use Google Search only to add dosages, preparation, research and safety/interaction checks, introduced with "Additionally, from current research...".
+- Tailor advice to the user's dosha.
+- Be empathetic and concise; use headings, bullets and emoji (🌿 herbs, 🧘 yoga, 🥗 diet).
+- Remind the user this is informational, not medical advice.
+- Discuss only health and Ayurveda; politely redirect other topics."""
+GREETING_INSTRUCTION = """You are AyurGenix AI, a warm Ayurvedic medicine assistant.
+Greet the user by name and ask a few short questions about their health concern.
+Do not give any health advice or recommendations yet."""
+
+# Limits on Gemini requests, shared by every session in this process
+MAX_CONCURRENT_REQUESTS = 20
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1.0  # seconds, doubled after each failed attempt
+
+# Turns answered locally, without calling the model
+SMALL_TALK = {
+    "hi", "hello", "hey", "hii", "namaste", "good morning", "good evening",
+    "thanks", "thank you", "thank you so much", "thx", "ok", "okay", "cool", "great", "bye",
+}
+SMALL_TALK_REPLY = (
+    "🌿 I'm here whenever you're ready. Tell me about any symptoms or health "
+    "concerns, and I'll suggest Ayurvedic herbs, diet and yoga that may help."
+)
+OFF_TOPIC_REPLY = (
+    "🌿 I can only help with health and Ayurveda. Please describe your symptoms "
+    "or ask about Ayurvedic remedies, diet, yoga or your dosha."
+)
+
+# Number of dataset rows passed to the model per question
+MAX_MATCHES = 3
+
+# Number of past messages the model sees alongside each new prompt
+HISTORY_TURNS = 6
+# Common words ignored when matching a prompt against earlier messages
+HISTORY_STOP_WORDS = {
+    "what", "when", "where", "which", "while", "with", "without", "this", "that",
+    "these", "those", "there", "their", "they", "them", "then", "than", "have",
+    "having", "been", "being", "were", "from", "into", "your", "yours", "about",
+    "also", "some", "more", "most", "very", "just", "only", "does", "doing",
+    "would", "could", "should", "will", "shall", "here", "hello", "please", "thanks",
+}
+
+# Response cache configuration
+RESPONSE_CACHE_DIR = "./.llm_cache"
+RESPONSE_CACHE_TTL = 3600  # seconds
+
+# Session store configuration
+SESSION_STORE_DIR = "./.sessions"
+SESSION_TTL = 86400  # seconds
+MAX_STORED_MESSAGES = 20
 
 # Page configuration
 st.set_page_config(
@@ -76,12 +145,112 @@ st.markdown("""
 @st.cache_data
 def load_dataset():
     try:
-        df = pd.read_excel("AyurGenixAI_Dataset (1).xlsx")
-        return df
+        # Built from the workbook by convert_dataset.py, so no Excel parsing here
+        return pd.read_parquet(DATASET_PARQUET, columns=DATASET_COLUMNS + ["_search_blob"])
     except Exception as e:
         st.error(f"Error loading dataset: {e}")
         return None
 
+# Build the in-memory search structures over the dataset: a full-text index
+# for ranked lookups, a word list for typo correction, an Aho-Corasick
+# automaton that finds disease and symptom phrases anywhere in a query in
+# one pass, and every row's context line ready for the prompt
+@st.cache_resource
+def build_search_index(df):
+    if df is None:
+        return None
+    con = sqlite3.connect(":memory:", check_same_thread=False)
+    con.execute("CREATE VIRTUAL TABLE ayur USING fts5(disease, symptoms, herbs, tokenize='porter unicode61')")
+    # rowid is the row's position in df so hits map straight back with iloc
+    columns = df[["Disease", "Symptoms", "Ayurvedic Herbs"]].fillna("").astype(str)
+    con.executemany(
+        "INSERT INTO ayur(rowid, disease, symptoms, herbs) VALUES (?, ?, ?, ?)",
+        columns.itertuples(index=True, name=None),
+    )
+    text = " ".join(columns.to_numpy().ravel()).lower()
+    vocabulary = sorted({word for word in re.findall(r"\w+", text) if len(word) > 3})
+    
+    # Disease names plus each comma- or slash-separated symptom phrase
+    phrases = {}
+    for position, disease, symptoms in columns[["Disease", "Symptoms"]].itertuples(index=True, name=None):
+        for phrase in [disease] + re.split(r"[,/]", symptoms):
+            phrase = phrase.strip().lower()
+            if len(phrase) > 3 and position not in phrases.get(phrase, ()):
+                phrases.setdefault(phrase, []).append(position)
+    automaton = ahocorasick.Automaton()
+    for phrase, positions in phrases.items():
+        automaton.add_word(phrase, (phrase, positions))
+    automaton.make_automaton()
+    
+    # Each row's line of model context, formatted once here instead of per query
+    snippets = [
+        f"{row['Disease']}"
+        f" | symptoms={row['Symptoms']}"
+        f" | herbs={row['Ayurvedic Herbs']}"
+        f" | formulation={row['Formulation']}"
+        f" | doshas={row['Doshas']}"
+        f" | diet={row['Diet and Lifestyle Recommendations']}"
+        f" | yoga={row['Yoga & Physical Therapy']}"
+        f" | prevention={row['Prevention']}\n"
+        for row in df.to_dict("records")
+    ]
+    return {
+        "fts": con,
+        "vocabulary": vocabulary,
+        "phrases": automaton,
+        "snippets": snippets,
+    }
+
+# Request settings for each model, built once per process rather than on
+# every rerun of this script
+@st.cache_resource
+def init_model_configs():
+    search_config = types.GenerateContentConfig(
+        tools=[types.Tool(google_search=types.GoogleSearch())],
+        max_output_tokens=MAX_OUTPUT_TOKENS,
+        system_instruction=SYSTEM_INSTRUCTION,
+    )
+    # Flash-Lite does not support the Google Search tool
+    fast_config = types.GenerateContentConfig(
+        max_output_tokens=MAX_OUTPUT_TOKENS,
+        system_instruction=GREETING_INSTRUCTION,
+    )
+    return {MODEL: search_config, MODEL_FAST: fast_config}
+
+# Words that mark a prompt as health-related even without a dataset match;
+# includes follow-up vocabulary so questions about earlier advice still go
+# through. Compiled once per process.
+@st.cache_resource
+def init_health_keywords():
+    # Stems may run on ("medic" -> "medicine"); short words must end at a word
+    # boundary so "ill", "ear" and "back" don't match "illustrate", "early" or "backup"
+    return re.compile(
+        r"\b(?:(?:ayurved|dosha|prakriti|herb|remed|medic|treat|heal|symptom|diseas|"
+        r"fever|cough|fatigu|sleep|stress|anxi|digest|stomach|breath|yoga|exercis|"
+        r"pranayam|meditat|massag|dosage|pregnan|allerg|doctor|recommend|suggest|"
+        r"explain|elaborat)\w*"
+        r"|(?:vata|pitta|kapha|cure|condition|pain|ache|hurt|sore|cold|sick|ill|tired|"
+        r"weak|mood|diet|food|eat|eating|drink|skin|hair|weight|blood|sugar|oil|tea|"
+        r"dose|take|taking|side effect|safe|period|body|head|joint|back|neck|chest|"
+        r"eye|ear|nose|throat|tooth|teeth|better|worse|feel|feeling|advice|how long|"
+        r"how often|how much|avoid|why|more|detail|else|again)(?:s|es)?\b)",
+        re.IGNORECASE,
+    )
+
+# Words that mark a prompt as clearly outside health and Ayurveda, the only
+# case where it is refused without asking the model. Compiled once per process.
+@st.cache_resource
+def init_off_topic_keywords():
+    return re.compile(
+        r"\b(python|javascript|java|coding|programming|code|sql|html|css|"
+        r"software|computer|laptop|phone|app|website|weather|forecast|cricket|"
+        r"football|soccer|tennis|match score|ipl|stock|stocks|share price|"
+        r"bitcoin|crypto|invest|loan|movie|movies|film|song|lyrics|poem|essay|"
+        r"story|joke|riddle|capital of|president|prime minister|election|"
+        r"politics|translate|homework|math|equation|car|bike|travel|flight|hotel)\b",
+        re.IGNORECASE,
+    )
+
 # Initialize Gemini client
 @st.cache_resource
 def init_client():
@@ -89,237 +258,284 @@ def init_client():
     if not api_key:
         return None
     try:
-        client = genai.Client(api_key=api_key)
+        # One pooled HTTP/2 connection is reused (and multiplexed) by every
+        # request instead of paying a TLS handshake each time
+        client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(client_args={"http2": True}),
+        )
         return client
     except Exception as e:
         st.error(f"Error initializing Gemini: {e}")
         return None
 
-# Search dataset for matching conditions
-def search_dataset(df, query):
+# Slots bounding how many Gemini requests all sessions run at once
+@st.cache_resource
+def init_request_slots():
+    return threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+# Open the on-disk Gemini response cache shared by all sessions
+@st.cache_resource
+def init_response_cache():
+    return Cache(RESPONSE_CACHE_DIR)
+
+# Open the on-disk store that lets a session survive reloads and restarts
+@st.cache_resource
+def init_session_store():
+    return Cache(SESSION_STORE_DIR)
+
+# Search dataset for matching conditions, returning their row positions
+def search_dataset(df, index, query):
     if df is None:
-        return []
+        return ()
     
+    # Rows containing the whole query verbatim come first. Only the distinct
+    # texts are scanned; each row then picks up its category's result.
     query_lower = query.lower()
-    matches = []
-    for idx, row in df.iterrows():
-        disease = str(row.get('Disease', '')).lower()
-        symptoms = str(row.get('Symptoms', '')).lower()
-        
-        if query_lower in disease or query_lower in symptoms:
-            matches.append(row)
-        else:
-            query_words = query_lower.split()
-            for word in query_words:
-                if len(word) > 3 and (word in disease or word in symptoms):
-                    matches.append(row)
-                    break
-    return matches[:5]
-
-# Format dataset matches for context - uses Excel columns
-def format_matches_for_context(matches):
-    if not matches:
+    blob = df["_search_blob"]
+    category_hits = np.asarray(blob.cat.categories.str.contains(query_lower, regex=False))
+    mask = category_hits[blob.cat.codes.to_numpy()]
+    positions = mask.nonzero()[0][:MAX_MATCHES].tolist()
+
+    # Then rows whose disease or a symptom is named in the query as whole words
+    if index is not None:
+        for end, (phrase, rows) in index["phrases"].iter(query_lower):
+            start = end - len(phrase) + 1
+            if (start > 0 and query_lower[start - 1].isalnum()) or (
+                end + 1 < len(query_lower) and query_lower[end + 1].isalnum()
+            ):
+                continue
+            positions.extend(row for row in rows if row not in positions)
+
+    # Fill the rest with BM25-ranked full-text hits on the longer query words
+    query_words = [word for word in re.findall(r"\w+", query_lower) if len(word) > 3]
+    if index is not None and query_words and len(positions) < MAX_MATCHES:
+        # Also search for the closest dataset word to each one, so typos like
+        # "astma" still reach the "asthma" rows
+        search_words = set(query_words)
+        for word in query_words:
+            match = process.extractOne(word, index["vocabulary"], scorer=fuzz.ratio, score_cutoff=80)
+            if match:
+                search_words.add(match[0])
+        fts_query = " OR ".join(f'"{word}"' for word in sorted(search_words))
+        rows = index["fts"].execute(
+            "SELECT rowid FROM ayur WHERE ayur MATCH ? ORDER BY bm25(ayur) LIMIT ?",
+            (fts_query, MAX_MATCHES),
+        ).fetchall()
+        for (rowid,) in rows:
+            if rowid not in positions:
+                positions.append(rowid)
+    return tuple(positions[:MAX_MATCHES])
+
+# Format dataset matches for context - one numbered line per match, taken
+# from the lines build_search_index prepared, keeping only the columns the
+# model actually draws recommendations from. Cached on the matched row
+# positions, since popular topics repeat.
+@st.cache_data(max_entries=256)
+def format_matches_for_context(row_ids):
+    if not row_ids:
         return "No direct matches found in the Ayurvedic database."
     
-    context = "**Relevant data from Ayurvedic database:**\n\n"
-    for i, match in enumerate(matches, 1):
-        context += f"""
-{i}. {match.get('Disease', 'N/A')}
-   Symptoms: {match.get('Symptoms', 'N/A')}
-   Duration of Treatment: {match.get('Duration of Treatment', 'N/A')}
-   Medical History: {match.get('Medical History', 'N/A')}
-   Current Medications: {match.get('Current Medications', 'N/A')}
-   Risk Factors: {match.get('Risk Factors', 'N/A')}
-   Stress Levels: {match.get('Stress Levels', 'N/A')}
-   Herbal/Alternative Remedies: {match.get('Herbal/Alternative Remedies', 'N/A')}
-   Ayurvedic Herbs: {match.get('Ayurvedic Herbs', 'N/A')}
-   Formulation: {match.get('Formulation', 'N/A')}
-   Doshas: {match.get('Doshas', 'N/A')}
-   Constitution/Prakriti: {match.get('Constitution/Prakriti', 'N/A')}
-   Diet and Lifestyle Recommendations: {match.get('Diet and Lifestyle Recommendations', 'N/A')}
-   Yoga & Physical Therapy: {match.get('Yoga & Physical Therapy', 'N/A')}
-   Prevention: {match.get('Prevention', 'N/A')}
-   Patient Recommendations: {match.get('Patient Recommendations', 'N/A')}
-"""
-    return context
-
-# Generate response
-def generate_response(client, prompt, conversation_history):
-    contents = []
-    
-    for msg in conversation_history[-6:]:
-        role = "user" if msg["role"] == "user" else "model"
-        contents.append(
-            types.Content(
-                role=role,
-                parts=[types.Part.from_text(text=msg["content"])],
-            )
-        )
-    
-    contents.append(
-        types.Content(
-            role="user",
-            parts=[types.Part.from_text(text=prompt)],
-        )
-    )
+    snippets = search_index["snippets"]
+    parts = ["Relevant data from Ayurvedic database:\n"]
+    for i, row_id in enumerate(row_ids, 1):
+        parts.append(f"{i}. {snippets[row_id]}")
+    return "".join(parts)
+
+# Reply locally to small talk and clearly off-topic prompts that open a
+# conversation; returns None when the prompt should go to Gemini.
+# conversation_history ends with the prompt itself.
+def canned_reply(prompt, row_ids, conversation_history):
+    # A short reply like "about a week" or "yes" right after the model asked
+    # something is probably the answer, so let the model see it
+    previous = conversation_history[-2] if len(conversation_history) > 1 else None
+    if (
+        previous
+        and previous["role"] == "model"
+        and previous["content"].rstrip().endswith("?")
+        and len(prompt.split()) <= 4
+    ):
+        return None
     
-    tools = [types.Tool(google_search=types.GoogleSearch())]
+    text = prompt.strip().lower().rstrip("!.?")
+    if text in SMALL_TALK:
+        return SMALL_TALK_REPLY
+    # A missing dataset match says nothing about the topic - only refuse
+    # prompts that are clearly about something else
+    if row_ids or health_keywords.search(text) or not off_topic_keywords.search(text):
+        return None
+    return OFF_TOPIC_REPLY
+
+# Pick the past messages most relevant to the new prompt, scored by how
+# many of its longer words they share. conversation_history ends with the
+# prompt itself; the result keeps it plus up to HISTORY_TURNS earlier
+# messages, always including the latest exchange for continuity.
+def select_history(conversation_history, prompt):
+    if len(conversation_history) <= HISTORY_TURNS + 1:
+        return conversation_history
     
-    # Updated System Instruction to include the "Possible Diseases" section requirement
-    config = types.GenerateContentConfig(
-        tools=tools,
-        system_instruction="""You are AyurGenix AI, a compassionate Ayurvedic medicine assistant. 
-        
-        CRITICAL: The DATABASE INFORMATION provided in the prompt is from a VERIFIED, 100% ACCURATE Ayurvedic medical database.
-
-        ALWAYS use the database information as your PRIMARY foundation.
-
-        HOW TO STRUCTURE YOUR RESPONSE:
-
-        1. **Possible Diseases Analysis**: 
-           - Start by analyzing the user's described symptoms.
-           - Compare these symptoms with the "Relevant data from Ayurvedic database".
-           - Create a clear section titled "### 🔍 Possible Ayurvedic Conditions".
-           - List the diseases from the database that match the symptoms. 
-           - If the symptoms are vague, suggest the most likely conditions based on Ayurvedic principles (Vata/Pitta/Kapha imbalance).
-
-        2. **Treatment & Recommendations**:
-           - Use the DATABASE to quote specific herbs, formulations, diet, and yoga.
-           - Use GOOGLE SEARCH to add dosages, preparation methods, and modern research.
-
-        Guidelines:
-        - Be empathetic and supportive.
-        - Start with the "Possible Ayurvedic Conditions" section to show you understand the issue.
-        - Follow with the treatment plan using the database.
-        - Consider user's dosha type in recommendations.
-        - Always remind this is informational, not medical advice.
-        - Focus ONLY on health and Ayurveda - redirect other topics politely.
-
-        When responding:
-        - Start with "Based on our verified Ayurvedic database..." for database info.
-        - Add "Additionally, from current research..." for Google Search supplementary info.
-        - Format with clear headings and bullet points. Use emoji (🌿 herbs, 🧘 yoga, 🥗 diet)."""
+    prompt_words = set(re.findall(r"\w{4,}", prompt.lower())) - HISTORY_STOP_WORDS
+    scores = [
+        len(prompt_words.intersection(re.findall(r"\w{4,}", msg["content"].lower())))
+        for msg in conversation_history
+    ]
+    # Highest score first; ties (including no overlap at all) go to the most recent
+    keep = set(range(len(scores) - 3, len(scores)))
+    for i in sorted(range(len(scores)), key=lambda i: (scores[i], i), reverse=True):
+        if len(keep) >= HISTORY_TURNS + 1:
+            break
+        keep.add(i)
+    return [conversation_history[i] for i in sorted(keep)]
+
+# Wrap a conversation message as the Content sent to Gemini
+def to_content(role, text):
+    return types.Content(
+        role="user" if role == "user" else "model",
+        parts=[types.Part.from_text(text=text)],
     )
+
+# Convert messages to Content, reusing the objects already built for
+# earlier turns of this session
+def to_contents(messages):
+    memo = st.session_state.content_memo
+    contents = []
+    for msg in messages:
+        key = (msg["role"], msg["content"])
+        if key not in memo:
+            memo[key] = to_content(*key)
+        contents.append(memo[key])
+    return contents
+
+# Add a finished exchange to the session's chat history, dropping the
+# oldest messages beyond MAX_STORED_MESSAGES along with their Content
+def remember_exchange(question, answer):
+    chat_history = (st.session_state.chat_history + [
+        {"role": "user", "content": question},
+        {"role": "model", "content": answer},
+    ])[-MAX_STORED_MESSAGES:]
+    kept = {(msg["role"], msg["content"]) for msg in chat_history}
+    st.session_state.chat_history = chat_history
+    st.session_state.content_memo = {
+        key: content for key, content in st.session_state.content_memo.items() if key in kept
+    }
+
+# Generate response, yielding the text as Gemini streams it back.
+# Only the main model's turns are part of the session's chat history;
+# other models answer the prompt on its own. For chat turns, question is
+# the user's own text, which is what the history keeps in place of the
+# full prompt (profile + database rows) it was sent with.
+def generate_response(client, prompt, conversation_history, model=MODEL, question=None):
+    in_session = model == MODEL
+    question = question or prompt
     
-    try:
-        response = client.models.generate_content(
-            model=MODEL,
-            contents=contents,
-            config=config,
-        )
-        if hasattr(response, 'text'):
-            return response.text
-        elif hasattr(response, 'candidates') and response.candidates:
-            text_parts = []
-            for candidate in response.candidates:
-                if hasattr(candidate, 'content') and candidate.content:
-                    for part in candidate.content.parts:
-                        if hasattr(part, 'text') and part.text:
-                            text_parts.append(part.text)
-            return ''.join(text_parts)
-        return "Unable to generate response."
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-# Helper function to sanitize text for PDF (ASCII-safe)
-def sanitize_for_pdf(text):
-    """Remove non-ASCII characters and clean text for PDF generation."""
-    if not text:
-        return ""
-    # Convert to string if not already
-    text = str(text)
-    # Remove markdown formatting
-    text = text.replace('**', '').replace('*', '')
-    text = text.replace('###', '').replace('##', '').replace('#', '')
-    # Encode to ASCII, replacing non-ASCII chars with closest equivalent or removing them
-    text = text.encode('ascii', 'ignore').decode('ascii')
-    # Clean up any extra whitespace
-    text = ' '.join(text.split())
-    return text
-
-# Generate PDF report
-def generate_pdf_report(user_info, conversation):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    
-    # Title
-    pdf.set_font("Helvetica", "B", 20)
-    pdf.cell(0, 10, "AyurGenix AI - Consultation Report", ln=True, align="C")
-    
-    pdf.set_font("Helvetica", "", 10)
-    pdf.cell(0, 8, f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", ln=True, align="C")
-    pdf.ln(10)
-    
-    # User Profile Section
-    pdf.set_font("Helvetica", "B", 14)
-    pdf.cell(0, 10, "User Profile", ln=True)
-    
-    profile_items = [
-        ("Name", user_info.get('name', 'Not provided')),
-        ("Age", str(user_info.get('age', 'Not provided'))),
-        ("Gender", user_info.get('gender', 'Not provided')),
-        ("Dosha Type", user_info.get('dosha', 'Unknown')),
-        ("Stress Level", user_info.get('stress', 'Not provided')),
-        ("Existing Conditions", user_info.get('conditions', 'None mentioned')),
-        ("Current Medications", user_info.get('medications', 'None mentioned')),
-    ]
+    # The session keeps the raw exchanges the model took part in; each turn
+    # sends the ones most relevant to this question. After a reset or a
+    # restored session the history starts from the saved conversation,
+    # leaving out the current question, which is its last message.
+    chat_history = []
+    if in_session:
+        if st.session_state.chat_history is None:
+            st.session_state.chat_history = conversation_history[:-1][-MAX_STORED_MESSAGES:]
+        chat_history = select_history(
+            st.session_state.chat_history + [{"role": "user", "content": question}], question
+        )[:-1]
     
-    for label, value in profile_items:
-        pdf.set_font("Helvetica", "B", 11)
-        pdf.cell(0, 7, f"{label}:", ln=True)
-        pdf.set_font("Helvetica", "", 11)
-        pdf.multi_cell(0, 6, sanitize_for_pdf(value))
-        pdf.ln(2)
+    contents = to_contents(chat_history) + [to_content("user", prompt)]
     
-    pdf.ln(5)
+    # Same model + the same messages have been answered before - reuse it.
+    # Case and spacing don't change the question, so they don't change the key.
+    sent_texts = [[msg["role"], msg["content"]] for msg in chat_history]
+    sent_texts.append(["user", " ".join(prompt.lower().split())])
+    cache_key = hashlib.blake2b(
+        json.dumps({"m": model, "c": sent_texts}).encode(),
+        digest_size=16,
+    ).hexdigest()
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        if in_session:
+            remember_exchange(question, cached)
+        yield cached
+        return
     
-    # Consultation Summary Section
-    pdf.set_font("Helvetica", "B", 14)
-    pdf.cell(0, 10, "Consultation Summary", ln=True)
-    pdf.ln(5)
+    text_parts = []
+    with request_slots:
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                for chunk in client.models.generate_content_stream(
+                    model=model, contents=contents, config=model_configs[model]
+                ):
+                    if chunk.text:
+                        text_parts.append(chunk.text)
+                        yield chunk.text
+                break
+            except Exception as e:
+                # Back off and retry rate limits and server errors, as long as
+                # nothing has been shown to the user yet
+                retryable = isinstance(e, errors.APIError) and (e.code == 429 or e.code >= 500)
+                if retryable and not text_parts and attempt < MAX_RETRIES:
+                    time.sleep(RETRY_BASE_DELAY * 2 ** attempt)
+                    continue
+                yield f"Error: {str(e)}"
+                return
     
-    for msg in conversation:
-        if msg["role"] == "user":
-            pdf.set_font("Helvetica", "B", 11)
-            pdf.set_text_color(0, 0, 128) # Blue for user
-            pdf.cell(0, 8, "You:", ln=True)
-            pdf.set_text_color(0, 0, 0)
-            pdf.set_font("Helvetica", "", 10)
-        else:
-            pdf.set_font("Helvetica", "B", 11)
-            pdf.set_text_color(0, 100, 0) # Green for AI
-            pdf.cell(0, 8, "AyurGenix AI:", ln=True)
-            pdf.set_text_color(0, 0, 0) # Reset to black
-            pdf.set_font("Helvetica", "", 10)
-            
-        # Sanitize content for PDF
-        content = sanitize_for_pdf(msg['content'])
-        pdf.multi_cell(0, 6, content)
-        pdf.ln(5)
-        
-    # Disclaimer
-    pdf.ln(10)
-    pdf.set_font("Helvetica", "I", 9)
-    pdf.set_text_color(100, 100, 100)
-    pdf.multi_cell(0, 6, "Disclaimer: This report is for informational purposes only. Please consult a qualified healthcare provider for medical concerns.")
+    if not text_parts:
+        yield "Unable to generate response."
+        return
     
-    # Return PDF as bytes
-    return bytes(pdf.output())
+    # Only successful answers are cached so errors get retried next time
+    response_cache.set(cache_key, ''.join(text_parts), expire=RESPONSE_CACHE_TTL)
+    if in_session:
+        remember_exchange(question, ''.join(text_parts))
+
+# Generate PDF report - cached on its inputs so repeat downloads reuse the
+# previous bytes. The timestamp is one of them, so a cached report never
+# shows an older time than its file name.
+@st.cache_data(show_spinner=False, max_entries=100)
+def generate_pdf_report(user_info, conversation, generated_at):
+    return build_pdf_report(user_info, conversation, generated_at)
+
+# Save what is needed to resume this session after a reload or restart
+def save_session(session_id):
+    session_store.set(
+        f"session:{session_id}",
+        {
+            "conversation": st.session_state.conversation[-MAX_STORED_MESSAGES:],
+            "user_info": st.session_state.user_info,
+            "profile_saved": st.session_state.profile_saved,
+            "greeting_sent": st.session_state.greeting_sent,
+        },
+        expire=SESSION_TTL,
+    )
+
+# Identify the browser session by an id kept in the URL
+session_store = init_session_store()
+session_id = st.query_params.get("sid")
+if not session_id:
+    session_id = uuid.uuid4().hex
+    st.query_params["sid"] = session_id
 
-# Initialize session state
+# Initialize session state in one go on its first run, restoring a saved
+# session over the defaults
 if "conversation" not in st.session_state:
-    st.session_state.conversation = []
-if "user_info" not in st.session_state:
-    st.session_state.user_info = {}
-if "profile_saved" not in st.session_state:
-    st.session_state.profile_saved = False
-if "greeting_sent" not in st.session_state:
-    st.session_state.greeting_sent = False
+    st.session_state.update({
+        "conversation": [],
+        "user_info": {},
+        "profile_saved": False,
+        "greeting_sent": False,
+        "chat_history": None,
+        "content_memo": {},
+        **session_store.get(f"session:{session_id}", {}),
+    })
 
 # Load dataset and client
 df = load_dataset()
+search_index = build_search_index(df)
 client = init_client()
+model_configs = init_model_configs()
+health_keywords = init_health_keywords()
+off_topic_keywords = init_off_topic_keywords()
+response_cache = init_response_cache()
+request_slots = init_request_slots()
 
 if not client:
     st.error("⚠️ Please set GOOGLE_API_KEY in your .env file")
@@ -364,25 +580,21 @@ with st.sidebar:
             st.session_state.profile_saved = True
             st.session_state.greeting_sent = False
             st.session_state.conversation = []
+            st.session_state.chat_history = None
+            # No rerun: the greeting below starts streaming in this same run
             st.success("✅ Profile saved!")
-            st.rerun()
 
     st.divider()
     
-    if st.session_state.conversation:
-        pdf_bytes = generate_pdf_report(st.session_state.user_info, st.session_state.conversation)
-        st.download_button(
-            label="📥 Download Report (PDF)",
-            data=pdf_bytes,
-            file_name=f"ayurgenix_report_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf",
-            mime="application/pdf",
-            use_container_width=True
-        )
+    # Filled in at the end of the script, once this run's reply is known
+    report_slot = st.empty()
         
+    # Cleared before the chat below renders, so this run already shows the
+    # fresh consultation without a rerun
     if st.button("🔄 New Consultation", use_container_width=True):
         st.session_state.conversation = []
         st.session_state.greeting_sent = False
-        st.rerun()
+        st.session_state.chat_history = None
 
     # Show dataset status
     st.divider()
@@ -397,7 +609,18 @@ st.caption("Your Personal Ayurvedic Medicine Assistant")
 
 st.divider()
 
-# Auto-generate greeting after profile save
+# Display conversation using Streamlit's native chat. Messages produced
+# later in this run are drawn into the same container, so no rerun is needed
+chat_container = st.container()
+for msg in st.session_state.conversation:
+    if msg["role"] == "user":
+        with chat_container.chat_message("user"):
+            st.markdown(msg["content"])
+    else:
+        with chat_container.chat_message("assistant", avatar="🌿"):
+            st.markdown(msg["content"])
+
+# Auto-generate greeting after profile save, rendered below the history
 if st.session_state.profile_saved and not st.session_state.greeting_sent and client:
     user_info = st.session_state.user_info
     
@@ -426,20 +649,10 @@ if st.session_state.profile_saved and not st.session_state.greeting_sent and cli
        
     Keep your response SHORT and focused on asking questions. Do NOT provide any advice yet."""
     
-    with st.spinner("🌿 Preparing your personalized consultation..."):
-        full_response = generate_response(client, greeting_prompt, [])
-        st.session_state.conversation.append({"role": "model", "content": full_response})
-        st.session_state.greeting_sent = True
-        st.rerun()
-
-# Display conversation using Streamlit's native chat
-for msg in st.session_state.conversation:
-    if msg["role"] == "user":
-        with st.chat_message("user"):
-            st.write(msg["content"])
-    else:
-        with st.chat_message("assistant", avatar="🌿"):
-            st.write(msg["content"])
+    with chat_container.chat_message("assistant", avatar="🌿"):
+        full_response = st.write_stream(generate_response(client, greeting_prompt, [], model=MODEL_FAST))
+    st.session_state.conversation.append({"role": "model", "content": full_response})
+    st.session_state.greeting_sent = True
 
 # Welcome message
 if not st.session_state.profile_saved:
@@ -461,14 +674,15 @@ if prompt := st.chat_input("Describe your symptoms or ask about Ayurvedic remedi
     else:
         # Show user message immediately
         st.session_state.conversation.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
-            st.write(prompt)
+        with chat_container.chat_message("user"):
+            st.markdown(prompt)
 
         # Get dataset context
-        matches = search_dataset(df, prompt)
-        dataset_context = format_matches_for_context(matches)
+        row_ids = search_dataset(df, search_index, prompt)
+        dataset_context = format_matches_for_context(row_ids)
         
-        # Build full prompt with context and request for "Possible Diseases" section
+        # Build full prompt with the profile, context and question; how to
+        # answer is covered by the system instruction
         user_info = st.session_state.user_info
         full_prompt = f"""User Profile: 
         Name: {user_info.get('name')}
@@ -483,25 +697,38 @@ if prompt := st.chat_input("Describe your symptoms or ask about Ayurvedic remedi
         === END DATABASE ===
         
         User Question: {prompt}
-        
-        CRITICAL INSTRUCTIONS:
-        
-        1. **Possible Diseases Section**:
-           - Based on the user's symptoms and the database context above, analyze and list "Possible Diseases".
-           - Look for matches between the user's symptoms and the database 'Disease' or 'Symptoms' columns.
-           - If no direct database match is clear, use your Ayurvedic knowledge to suggest likely imbalances/conditions.
-           - Present this as the FIRST section of your response.
-        
-        2. **Recommendations**:
-           - YOU MUST use the database information as your PRIMARY source for recommendations.
-           - Quote the specific herbs, formulations, diet, yoga recommendations from the database.
-           - Only use Google Search to supplement or verify safety/interactions.
-           - Start your response with "Based on our verified Ayurvedic database..." if database matches found.
         """
         
-        # Generate response
-        with st.spinner("🌿 Consulting ancient wisdom..."):
-            full_response = generate_response(client, full_prompt, st.session_state.conversation)
-            st.session_state.conversation.append({"role": "model", "content": full_response})
-            st.rerun()
+        # Stream the response into the chat as it is generated, unless
+        # it is small talk or off-topic and can be answered locally
+        canned = canned_reply(prompt, row_ids, st.session_state.conversation)
+        with chat_container.chat_message("assistant", avatar="🌿"):
+            if canned:
+                st.markdown(canned)
+                full_response = canned
+            else:
+                full_response = st.write_stream(generate_response(
+                    client, full_prompt, st.session_state.conversation, question=prompt
+                ))
+        st.session_state.conversation.append({"role": "model", "content": full_response})
+
+# Offer the report last so it includes any reply streamed in this run.
+# The PDF is only built when the button is clicked, from a snapshot of the
+# session taken now, so ordinary reruns never lay out a PDF.
+if st.session_state.conversation:
+    report_time = datetime.now()
+    report_slot.download_button(
+        label="📥 Download Report (PDF)",
+        data=partial(
+            generate_pdf_report,
+            dict(st.session_state.user_info),
+            list(st.session_state.conversation),
+            report_time.strftime('%Y-%m-%d %H:%M'),
+        ),
+        file_name=f"ayurgenix_report_{report_time.strftime('%Y%m%d_%H%M')}.pdf",
+        mime="application/pdf",
+        use_container_width=True
+    )
 
+# Persist the session so a reload can resume it
+save_session(session_id)